@@ -0,0 +1,65 @@
+from typing import TYPE_CHECKING, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, ConfigDict
+
+from dependencies import get_rag
+
+if TYPE_CHECKING:
+    from rag_system import RAGSystem
+
+# API routes, kept apart from app.py so tests can mount them without building RAGSystem
+router = APIRouter()
+
+# Pydantic models for request/response
+class QueryRequest(BaseModel):
+    """Request model for course queries"""
+    model_config = ConfigDict(extra="ignore")
+    
+    query: str
+    session_id: Optional[str] = None
+
+class QueryResponse(BaseModel):
+    """Response model for course queries"""
+    answer: str
+    sources: List[str]
+    session_id: str
+
+class CourseStats(BaseModel):
+    """Response model for course statistics"""
+    total_courses: int
+    course_titles: List[str]
+
+# API Endpoints
+
+@router.post("/api/query", response_model=QueryResponse)
+async def query_documents(request: QueryRequest, rag: "RAGSystem" = Depends(get_rag)):
+    """Process a query and return response with sources"""
+    try:
+        # Create session if not provided
+        session_id = request.session_id
+        if not session_id:
+            session_id = rag.session_manager.create_session()
+        
+        # Process query using RAG system
+        answer, sources = rag.query(request.query, session_id)
+        
+        return QueryResponse(
+            answer=answer,
+            sources=sources,
+            session_id=session_id
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/api/courses", response_model=CourseStats)
+async def get_course_stats(rag: "RAGSystem" = Depends(get_rag)):
+    """Get course analytics and statistics"""
+    try:
+        analytics = rag.get_course_analytics()
+        return CourseStats(
+            total_courses=analytics["total_courses"],
+            course_titles=analytics["course_titles"]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
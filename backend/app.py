@@ -1,16 +1,17 @@
 import warnings
 warnings.filterwarnings("ignore", message="resource_tracker: There appear to be.*")
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
 import os
 
 from config import config
 from rag_system import RAGSystem
+import dependencies
+from dependencies import get_rag
+from api import router
 
 # Initialize FastAPI app
 app = FastAPI(title="Course Materials RAG System", root_path="")
@@ -31,59 +32,11 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
-# Initialize RAG system
-rag_system = RAGSystem(config)
-
-# Pydantic models for request/response
-class QueryRequest(BaseModel):
-    """Request model for course queries"""
-    query: str
-    session_id: Optional[str] = None
-
-class QueryResponse(BaseModel):
-    """Response model for course queries"""
-    answer: str
-    sources: List[str]
-    session_id: str
-
-class CourseStats(BaseModel):
-    """Response model for course statistics"""
-    total_courses: int
-    course_titles: List[str]
+# Initialize RAG system; dependencies.rag_system is the single shared instance
+dependencies.rag_system = RAGSystem(config)
 
 # API Endpoints
-
-@app.post("/api/query", response_model=QueryResponse)
-async def query_documents(request: QueryRequest):
-    """Process a query and return response with sources"""
-    try:
-        # Create session if not provided
-        session_id = request.session_id
-        if not session_id:
-            session_id = rag_system.session_manager.create_session()
-        
-        # Process query using RAG system
-        answer, sources = rag_system.query(request.query, session_id)
-        
-        return QueryResponse(
-            answer=answer,
-            sources=sources,
-            session_id=session_id
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@app.get("/api/courses", response_model=CourseStats)
-async def get_course_stats():
-    """Get course analytics and statistics"""
-    try:
-        analytics = rag_system.get_course_analytics()
-        return CourseStats(
-            total_courses=analytics["total_courses"],
-            course_titles=analytics["course_titles"]
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+app.include_router(router)
 
 @app.on_event("startup")
 async def startup_event():
@@ -92,7 +45,8 @@ async def startup_event():
     if os.path.exists(docs_path):
         print("Loading initial documents...")
         try:
-            courses, chunks = rag_system.add_course_folder(docs_path, clear_existing=False)
+            rag = await get_rag()
+            courses, chunks = rag.add_course_folder(docs_path, clear_existing=False)
             print(f"Loaded {courses} courses with {chunks} chunks")
         except Exception as e:
             print(f"Error loading documents: {e}")
@@ -0,0 +1,14 @@
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from rag_system import RAGSystem
+
+# Set by app.py once the RAG system is built; kept in this module so tests can
+# import get_rag without constructing RAGSystem
+rag_system: Optional["RAGSystem"] = None
+
+async def get_rag() -> "RAGSystem":
+    """Dependency returning the shared RAG system"""
+    if rag_system is None:
+        raise RuntimeError("RAG system not initialised")
+    return rag_system
@@ -1,11 +1,72 @@
-import pytest
-from unittest.mock import Mock, MagicMock, patch
-from typing import Dict, Any, List
 import sys
-import os
+import pytest
+import pytest_asyncio
+from collections import namedtuple
+from unittest.mock import AsyncMock, Mock, MagicMock, patch
+from types import MappingProxyType, ModuleType, SimpleNamespace
+from typing import Dict, Any, List, Optional
+from pytest_socket import disable_socket
+
+from api import router
+from dependencies import get_rag
+
+def pytest_runtest_setup():
+    """Block network access; mark a test with enable_socket to opt in"""
+    # Unix sockets stay available for the asyncio event loop's self-pipe
+    disable_socket(allow_unix_socket=True)
+
+# Shared, read-only test data (built once at import)
+_SAMPLE_COURSES = (
+    MappingProxyType({
+        "title": "Introduction to Machine Learning",
+        "link": "https://example.com/ml",
+        "instructor": "John Doe",
+        "lessons": (
+            MappingProxyType({"lesson_number": 0, "title": "Introduction", "link": "https://example.com/ml/lesson0"}),
+            MappingProxyType({"lesson_number": 1, "title": "Supervised Learning", "link": None}),
+            MappingProxyType({"lesson_number": 2, "title": "Unsupervised Learning", "link": None})
+        )
+    }),
+    MappingProxyType({
+        "title": "Advanced Python Programming",
+        "link": "https://example.com/python",
+        "instructor": "Jane Smith",
+        "lessons": (
+            MappingProxyType({"lesson_number": 0, "title": "Python Basics", "link": None}),
+            MappingProxyType({"lesson_number": 1, "title": "Object-Oriented Programming", "link": None})
+        )
+    })
+)
+
+_MOCK_CONFIG = MappingProxyType({
+    "api_key": "test_api_key",
+    "model": "test_model",
+    "max_tokens": 1000,
+    "temperature": 0.7,
+    "chunk_size": 800,
+    "chunk_overlap": 100,
+    "max_conversation_history": 2
+})
+
+_DEFAULT_ANALYTICS = MappingProxyType({
+    "total_courses": 3,
+    "course_titles": ("Course 1", "Course 2", "Course 3")
+})
 
-# Add parent directory to path for imports
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+def _restore(configure):
+    """Build a reset that clears everything a test changed on a shared mock, then reapplies its defaults"""
+    def reset(mock):
+        mock.reset_mock(return_value=True, side_effect=True)
+        configure(mock)
+    return reset
+
+def _reset_anthropic_client(mock_client):
+    """Clear everything tests scripted on the patched client instance"""
+    mock_client.return_value.reset_mock(return_value=True, side_effect=True)
+
+def _reset_test_client(client):
+    """Restore the test app's fake RAG to its default configuration"""
+    client.mock_rag.reset()
 
 # Shared test data
 @pytest.fixture
@@ -16,36 +77,13 @@ def sample_query_request():
         "session_id": "test_session_123"
     }
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_courses():
-    """Sample course data for testing"""
-    return [
-        {
-            "title": "Introduction to Machine Learning",
-            "link": "https://example.com/ml",
-            "instructor": "John Doe",
-            "lessons": [
-                {"lesson_number": 0, "title": "Introduction", "link": "https://example.com/ml/lesson0"},
-                {"lesson_number": 1, "title": "Supervised Learning", "link": None},
-                {"lesson_number": 2, "title": "Unsupervised Learning", "link": None}
-            ]
-        },
-        {
-            "title": "Advanced Python Programming",
-            "link": "https://example.com/python",
-            "instructor": "Jane Smith",
-            "lessons": [
-                {"lesson_number": 0, "title": "Python Basics", "link": None},
-                {"lesson_number": 1, "title": "Object-Oriented Programming", "link": None}
-            ]
-        }
-    ]
+    """Sample course data for testing (shared, read-only)"""
+    return _SAMPLE_COURSES
 
-@pytest.fixture
-def mock_rag_system():
-    """Mock RAG system for testing API endpoints"""
-    mock = MagicMock()
-    
+def _configure_rag_mock(mock):
+    """Apply the mock RAG system's default return values"""
     # Mock query method
     mock.query.return_value = (
         "Machine learning is a subset of artificial intelligence that enables systems to learn from data.",
@@ -69,34 +107,28 @@ def mock_rag_system():
     
     return mock
 
-@pytest.fixture
-def mock_vector_store():
-    """Mock vector store for testing"""
-    from unittest.mock import MagicMock
-    
-    mock = MagicMock()
-    mock.search.return_value = MagicMock(
-        chunks=[
-            MagicMock(
-                content="Machine learning content",
-                metadata={
-                    "course_title": "Introduction to Machine Learning",
-                    "lesson_number": 1,
-                    "lesson_title": "Supervised Learning"
-                }
-            )
-        ],
-        scores=[0.95]
-    )
+# Plain read-only records for vector store search results
+_Chunk = namedtuple("Chunk", "content metadata")
+_SearchResult = namedtuple("SearchResult", "chunks scores")
+
+_SEARCH_CHUNK = _Chunk(
+    "Machine learning content",
+    {
+        "course_title": "Introduction to Machine Learning",
+        "lesson_number": 1,
+        "lesson_title": "Supervised Learning"
+    }
+)
+
+def _configure_vector_store_mock(mock):
+    """Apply the mock vector store's default return values"""
+    mock.search.return_value = _SearchResult([_SEARCH_CHUNK], [0.95])
     mock.list_courses.return_value = ["Introduction to Machine Learning", "Advanced Python Programming"]
     
     return mock
 
-@pytest.fixture
-def mock_document_processor():
-    """Mock document processor for testing"""
-    mock = MagicMock()
-    
+def _configure_document_processor_mock(mock):
+    """Apply the mock document processor's default return values"""
     # Mock process_file method
     mock.process_file.return_value = (
         MagicMock(
@@ -121,39 +153,53 @@ def mock_document_processor():
     
     return mock
 
+# Mocks are built once and shared; after each test _reset_mocks clears whatever
+# the test changed on them and reapplies the defaults above
+_RAG_MOCK = _configure_rag_mock(MagicMock())
+_VECTOR_STORE_MOCK = _configure_vector_store_mock(Mock())
+_DOCUMENT_PROCESSOR_MOCK = _configure_document_processor_mock(MagicMock())
+
+@pytest.fixture
+def mock_rag_system():
+    """Mock RAG system for testing API endpoints"""
+    return _RAG_MOCK
+
+@pytest.fixture
+def mock_vector_store():
+    """Mock vector store for testing"""
+    return _VECTOR_STORE_MOCK
+
+@pytest.fixture
+def mock_document_processor():
+    """Mock document processor for testing"""
+    return _DOCUMENT_PROCESSOR_MOCK
+
 @pytest.fixture
 def mock_ai_generator():
     """Mock AI generator for testing"""
-    mock = MagicMock()
-    mock.generate_response.return_value = "This is a test response from AI"
-    return mock
+    return SimpleNamespace(generate_response=Mock(return_value="This is a test response from AI"))
 
-@pytest.fixture
-def mock_session_manager():
-    """Mock session manager for testing"""
-    mock = MagicMock()
+def _configure_session_manager_mock(mock):
+    """Apply the mock session manager's default return values"""
     mock.create_session.return_value = "test_session_789"
     mock.get_conversation_history.return_value = "User: Previous question\nAssistant: Previous answer"
     mock.add_exchange.return_value = None
     return mock
 
-@pytest.fixture
+@pytest.fixture(scope="session")
+def mock_session_manager():
+    """Mock session manager for testing"""
+    return _configure_session_manager_mock(
+        Mock(spec=["create_session", "get_conversation_history", "add_exchange"])
+    )
+
+@pytest.fixture(scope="session")
 def mock_config():
-    """Mock configuration for testing"""
-    return {
-        "api_key": "test_api_key",
-        "model": "test_model",
-        "max_tokens": 1000,
-        "temperature": 0.7,
-        "chunk_size": 800,
-        "chunk_overlap": 100,
-        "max_conversation_history": 2
-    }
+    """Mock configuration for testing (shared, read-only)"""
+    return _MOCK_CONFIG
 
-@pytest.fixture
-def mock_tool_manager():
-    """Mock tool manager for testing"""
-    mock = MagicMock()
+def _configure_tool_manager_mock(mock):
+    """Apply the mock tool manager's default return values"""
     mock.execute_tool.return_value = "Tool execution result"
     mock.get_tool_definitions.return_value = [
         {
@@ -170,10 +216,13 @@ def mock_tool_manager():
     ]
     return mock
 
-@pytest.fixture
-def mock_search_tool():
-    """Mock search tool for testing"""
-    mock = MagicMock()
+@pytest.fixture(scope="session")
+def mock_tool_manager():
+    """Mock tool manager for testing"""
+    return _configure_tool_manager_mock(Mock(spec=["execute_tool", "get_tool_definitions"]))
+
+def _configure_search_tool_mock(mock):
+    """Apply the mock search tool's default return values"""
     mock.execute.return_value = "Search results for query"
     mock.get_definition.return_value = {
         "name": "search_course_content",
@@ -189,89 +238,134 @@ def mock_search_tool():
     mock.last_sources = ["Source 1", "Source 2"]
     return mock
 
+@pytest.fixture(scope="session")
+def mock_search_tool():
+    """Mock search tool for testing"""
+    return _configure_search_tool_mock(MagicMock())
+
 # Test client fixtures
-@pytest.fixture
-def test_client():
-    """Create test client for FastAPI app without static file mounting"""
-    from fastapi import FastAPI, HTTPException
-    from fastapi.testclient import TestClient
-    from pydantic import BaseModel
-    from typing import List, Optional
+def _provide_rag(rag):
+    """Build an async get_rag override returning rag (sync overrides would run in a threadpool)"""
+    async def provide():
+        return rag
+    return provide
+
+def _is_exception(value):
+    """Whether value is an exception instance or class"""
+    return isinstance(value, BaseException) or (
+        isinstance(value, type) and issubclass(value, BaseException)
+    )
+
+class _Stub:
+    """Callable with a configurable return_value/side_effect, without MagicMock call tracking"""
+    def __init__(self, return_value=None):
+        self.return_value = return_value
+        self.side_effect = None
     
-    # Create a test app without static file mounting
-    app = FastAPI(title="Test Course Materials RAG System")
+    @property
+    def side_effect(self):
+        return self._side_effect
     
-    # Define models
-    class QueryRequest(BaseModel):
-        query: str
-        session_id: Optional[str] = None
+    @side_effect.setter
+    def side_effect(self, value):
+        # Iterables yield successive results, as with MagicMock
+        if value is not None and not callable(value) and not _is_exception(value):
+            value = iter(value)
+        self._side_effect = value
     
-    class QueryResponse(BaseModel):
-        answer: str
-        sources: List[str]
-        session_id: str
+    def __call__(self, *args, **kwargs):
+        side_effect = self._side_effect
+        if side_effect is None:
+            return self.return_value
+        # Exceptions (raised directly or yielded by an iterable) are raised, as with MagicMock
+        if _is_exception(side_effect):
+            raise side_effect
+        if not callable(side_effect):
+            result = next(side_effect)
+            if _is_exception(result):
+                raise result
+            return result
+        return side_effect(*args, **kwargs)
+
+class FakeRAG:
+    """Plain stand-in for RAGSystem exposing only what the API endpoints call"""
+    def __init__(self):
+        self.reset()
     
-    class CourseStats(BaseModel):
-        total_courses: int
-        course_titles: List[str]
+    def reset(self):
+        """Restore the default return values the API tests expect"""
+        self.query = _Stub((
+            "This is a test response",
+            ["Source 1", "Source 2"]
+        ))
+        self.get_course_analytics = _Stub(_DEFAULT_ANALYTICS)
+        self.session_manager = SimpleNamespace(create_session=_Stub("test_session_123"))
+
+@pytest_asyncio.fixture(scope="session")
+async def test_client():
+    """Create async test client for FastAPI app without static file mounting (shared by the session)"""
+    from fastapi import FastAPI
+    from fastapi.responses import ORJSONResponse
+    from httpx import ASGITransport, AsyncClient
     
-    # Create mock RAG system
-    mock_rag = MagicMock()
-    mock_rag.query.return_value = (
-        "This is a test response",
-        ["Source 1", "Source 2"]
-    )
-    mock_rag.get_course_analytics.return_value = {
-        "total_courses": 3,
-        "course_titles": ["Course 1", "Course 2", "Course 3"]
-    }
-    mock_rag.session_manager.create_session.return_value = "test_session_123"
+    # Create a test app without static file mounting
+    app = FastAPI(title="Test Course Materials RAG System", default_response_class=ORJSONResponse)
     
-    # Define endpoints
-    @app.post("/api/query", response_model=QueryResponse)
-    async def query_documents(request: QueryRequest):
-        try:
-            session_id = request.session_id
-            if not session_id:
-                session_id = mock_rag.session_manager.create_session()
-            
-            answer, sources = mock_rag.query(request.query, session_id)
-            
-            return QueryResponse(
-                answer=answer,
-                sources=sources,
-                session_id=session_id
-            )
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+    # Create fake RAG system and inject it through app.py's get_rag dependency
+    mock_rag = FakeRAG()
+    app.dependency_overrides[get_rag] = _provide_rag(mock_rag)
     
-    @app.get("/api/courses", response_model=CourseStats)
-    async def get_course_stats():
-        try:
-            analytics = mock_rag.get_course_analytics()
-            return CourseStats(
-                total_courses=analytics["total_courses"],
-                course_titles=analytics["course_titles"]
-            )
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+    # Mount app.py's API routes; the static frontend is left out
+    app.include_router(router)
     
     @app.get("/")
     async def root():
         return {"message": "Course Materials RAG System API"}
     
-    # Store mock_rag on app for test access
-    app.mock_rag = mock_rag
-    
-    # Create test client
-    client = TestClient(app)
-    client.mock_rag = mock_rag  # Attach mock for test access
-    
-    return client
+    # Create test client; requests are dispatched to the app in-process on the test event loop
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        client.app = app
+        client.mock_rag = mock_rag  # Attach mock for test access
+        yield client
+    app.dependency_overrides.clear()
+
+@pytest_asyncio.fixture(scope="session")
+async def baseline_query_response(test_client):
+    """Happy-path POST /api/query response shared by read-only assertion tests"""
+    return await test_client.post(
+        "/api/query",
+        json={
+            "query": "What is machine learning?",
+            "session_id": "existing_session_123"
+        }
+    )
+
+def _configure_api_rag_mock(mock):
+    """Apply the test app's default return values to a MagicMock RAG"""
+    defaults = FakeRAG()
+    mock.query.return_value = defaults.query.return_value
+    mock.get_course_analytics.return_value = defaults.get_course_analytics.return_value
+    mock.session_manager.create_session.return_value = defaults.session_manager.create_session.return_value
+    return mock
+
+_API_RAG_SPY = _configure_api_rag_mock(MagicMock())
 
 @pytest.fixture
+def rag_spy(test_client):
+    """MagicMock RAG swapped into test_client for tests that assert on calls"""
+    spy = _API_RAG_SPY
+    fake_rag = test_client.mock_rag
+    overrides = test_client.app.dependency_overrides
+    test_client.mock_rag = spy
+    overrides[get_rag] = _provide_rag(spy)
+    yield spy
+    _restore(_configure_api_rag_mock)(spy)
+    test_client.mock_rag = fake_rag
+    overrides[get_rag] = _provide_rag(fake_rag)
+
+@pytest.fixture(scope="session")
 def mock_anthropic_client():
-    """Mock Anthropic client for testing"""
+    """Mock Anthropic client for testing (patched once per session)"""
     with patch('anthropic.Anthropic') as mock_client:
         yield mock_client
 
@@ -285,15 +379,8 @@ def mock_env_vars(monkeypatch):
     monkeypatch.setenv("TEMPERATURE", "0.7")
 
 # File system fixtures
-@pytest.fixture
-def temp_docs_dir(tmp_path):
-    """Create temporary docs directory with test files"""
-    docs_dir = tmp_path / "docs"
-    docs_dir.mkdir()
-    
-    # Create sample course file
-    course_file = docs_dir / "test_course.txt"
-    course_file.write_text("""Course Title: Test Course
+# Sample course document, pre-encoded so fixtures can write it without re-encoding
+_COURSE_BYTES = b"""Course Title: Test Course
 Course Link: https://example.com/test
 Course Instructor: Test Instructor
 
@@ -302,37 +389,94 @@ This is the introduction lesson content.
 
 Lesson 1: Basic Concepts
 This lesson covers basic concepts of the subject.
-""")
+"""
+
+@pytest.fixture(scope="session")
+def _docs_template(tmp_path_factory):
+    """Write the sample docs directory once per session"""
+    docs_dir = tmp_path_factory.mktemp("docs_template")
+    
+    # Create sample course file
+    course_file = docs_dir / "test_course.txt"
+    course_file.write_bytes(_COURSE_BYTES)
     
     return docs_dir
 
 @pytest.fixture
+def temp_docs_dir(_docs_template):
+    """Docs directory with test files (shared by the session; do not modify)"""
+    return _docs_template
+
+def _configure_chromadb_client(mock_client):
+    """Apply the default collection returned by the stub PersistentClient"""
+    mock_collection = mock_client.return_value.get_or_create_collection.return_value
+    mock_collection.query.return_value = {
+        'documents': [["Test document content"]],
+        'metadatas': [[{"course_title": "Test Course", "lesson_number": 0}]],
+        'distances': [[0.1]]
+    }
+    mock_collection.count.return_value = 10
+    return mock_client
+
+def _build_chromadb_stub():
+    """Build a stand-in chromadb module whose PersistentClient returns a prebuilt collection"""
+    chromadb = ModuleType("chromadb")
+    chromadb.__path__ = []  # Mark as a package so submodule imports resolve via sys.modules
+    chromadb.PersistentClient = _configure_chromadb_client(MagicMock())
+    chromadb.config = ModuleType("chromadb.config")
+    chromadb.config.Settings = MagicMock()
+    chromadb.utils = ModuleType("chromadb.utils")
+    chromadb.utils.__path__ = []
+    chromadb.utils.embedding_functions = ModuleType("chromadb.utils.embedding_functions")
+    chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction = MagicMock()
+    return chromadb
+
+# Installed at import so code under test never loads the real (heavy) chromadb package.
+# This applies to the whole session: integration-marked tests get the stub too.
+_CHROMADB_STUB = _build_chromadb_stub()
+sys.modules["chromadb"] = _CHROMADB_STUB
+sys.modules["chromadb.config"] = _CHROMADB_STUB.config
+sys.modules["chromadb.utils"] = _CHROMADB_STUB.utils
+sys.modules["chromadb.utils.embedding_functions"] = _CHROMADB_STUB.utils.embedding_functions
+
+@pytest.fixture(scope="session")
 def mock_chromadb_client():
     """Mock ChromaDB client for testing"""
-    with patch('chromadb.PersistentClient') as mock_client:
-        mock_collection = MagicMock()
-        mock_collection.query.return_value = {
-            'documents': [["Test document content"]],
-            'metadatas': [[{"course_title": "Test Course", "lesson_number": 0}]],
-            'distances': [[0.1]]
-        }
-        mock_collection.count.return_value = 10
-        
-        mock_instance = MagicMock()
-        mock_instance.get_or_create_collection.return_value = mock_collection
-        mock_client.return_value = mock_instance
-        
-        yield mock_client
+    return _CHROMADB_STUB.PersistentClient
 
 # Helper fixtures for async testing
 @pytest.fixture
 def async_mock():
     """Helper to create async mock functions"""
-    import asyncio
-    
     def create_async_mock(return_value=None):
-        async def async_func(*args, **kwargs):
-            return return_value
-        return MagicMock(side_effect=async_func)
+        return AsyncMock(return_value=return_value)
     
-    return create_async_mock
\ No newline at end of file
+    return create_async_mock
+
+# Registry of fixtures shared across tests and how to reset each one after a test
+_MOCK_RESETS = {
+    "mock_rag_system": _restore(_configure_rag_mock),
+    "mock_vector_store": _restore(_configure_vector_store_mock),
+    "mock_document_processor": _restore(_configure_document_processor_mock),
+    "mock_session_manager": _restore(_configure_session_manager_mock),
+    "mock_tool_manager": _restore(_configure_tool_manager_mock),
+    "mock_search_tool": _restore(_configure_search_tool_mock),
+    "mock_chromadb_client": _restore(_configure_chromadb_client),
+    "mock_anthropic_client": _reset_anthropic_client,
+    "test_client": _reset_test_client,
+}
+
+@pytest.fixture(autouse=True)
+def _reset_mocks(request):
+    """Reset the shared fixtures a test used once it finishes"""
+    if request.node.get_closest_marker("readonly"):
+        yield
+        return
+    used = [
+        (request.getfixturevalue(name), reset)
+        for name, reset in _MOCK_RESETS.items()
+        if name in request.fixturenames
+    ]
+    yield
+    for value, reset in used:
+        reset(value)
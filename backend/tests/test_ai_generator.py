@@ -1,13 +1,9 @@
 import pytest
+from collections import deque
 from unittest.mock import Mock, MagicMock, patch, call
-import anthropic
-from typing import List, Dict, Any
-
-# Import the module to test
-import sys
-import os
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from ai_generator import AIGenerator
+from types import MappingProxyType
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional
 
 
 class MockContentBlock:
@@ -27,20 +23,13 @@ class MockResponse:
         self.stop_reason = stop_reason
 
 
-@pytest.fixture
-def mock_anthropic_client():
-    """Mock Anthropic client"""
-    with patch('anthropic.Anthropic') as mock_client:
-        yield mock_client
-
-
-@pytest.fixture
+@pytest.fixture(scope="module")
 def ai_generator(mock_anthropic_client):
-    """Create AI generator instance with mocked client"""
-    mock_instance = MagicMock()
-    mock_anthropic_client.return_value = mock_instance
-    generator = AIGenerator(api_key="test_key", model="test_model")
-    return generator
+    """Create AI generator instance with the conftest-patched Anthropic client (shared by the module)"""
+    from ai_generator import AIGenerator
+    
+    mock_anthropic_client.return_value = MagicMock()
+    return AIGenerator(api_key="test_key", model="test_model")
 
 
 @pytest.fixture
@@ -51,11 +40,11 @@ def mock_tool_manager():
     return manager
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def sample_tools():
-    """Sample tool definitions"""
-    return [
-        {
+    """Sample tool definitions (read-only, shared by the module)"""
+    return (
+        MappingProxyType({
             "name": "search_course_content",
             "description": "Search course materials",
             "input_schema": {
@@ -65,8 +54,8 @@ def sample_tools():
                 },
                 "required": ["query"]
             }
-        },
-        {
+        }),
+        MappingProxyType({
             "name": "get_course_outline",
             "description": "Get course outline",
             "input_schema": {
@@ -76,226 +65,184 @@ def sample_tools():
                 },
                 "required": ["course_title"]
             }
-        }
-    ]
+        })
+    )
 
 
-class TestSequentialToolCalling:
-    """Test sequential tool calling functionality"""
+def _text_response(text: str) -> MockResponse:
+    """Build a final text response"""
+    return MockResponse(content=[MockContentBlock(type="text", text=text)], stop_reason="end_turn")
+
+
+def _tool_response(name: str, input: Dict, id: str) -> MockResponse:
+    """Build a response requesting a single tool call"""
+    return MockResponse(
+        content=[MockContentBlock(type="tool_use", name=name, input=input, id=id)],
+        stop_reason="tool_use"
+    )
+
+
+def _set_responses(generator, *responses):
+    """Script successive messages.create results; exception instances are raised"""
+    queue = deque(responses)
     
-    def test_no_tools_direct_response(self, ai_generator):
-        """Test direct response when no tools are used"""
-        # Setup
-        mock_response = MockResponse(
-            content=[MockContentBlock(type="text", text="Direct answer without tools")],
-            stop_reason="end_turn"
-        )
-        ai_generator.client.messages.create.return_value = mock_response
-        
-        # Execute
-        result = ai_generator.generate_response(
-            query="What is 2+2?",
-            tools=None,
-            tool_manager=None
-        )
-        
-        # Verify
-        assert result == "Direct answer without tools"
-        assert ai_generator.client.messages.create.call_count == 1
+    def next_response(*args, **kwargs):
+        response = queue.popleft()
+        if isinstance(response, Exception):
+            raise response
+        return response
     
-    def test_single_tool_call(self, ai_generator, mock_tool_manager, sample_tools):
-        """Test single tool call followed by final response"""
-        # Setup
-        tool_use_response = MockResponse(
-            content=[
-                MockContentBlock(
-                    type="tool_use",
-                    name="search_course_content",
-                    input={"query": "machine learning"},
-                    id="tool_1"
-                )
+    generator.client.messages.create.side_effect = next_response
+
+
+@dataclass
+class Scenario:
+    """Scripted API responses and the expected outcome of generate_response"""
+    responses: List[Any]
+    expected_result: str
+    expected_api_calls: int
+    expected_tool_calls: List[Any] = field(default_factory=list)
+    tool_results: Any = None
+    tool_side_effect: Any = None
+    tools_enabled: bool = True
+    max_tool_rounds: Optional[int] = None
+
+
+# Scenario table built once at import
+SCENARIOS = [
+    pytest.param(
+        Scenario(
+            responses=[_text_response("Direct answer without tools")],
+            expected_result="Direct answer without tools",
+            expected_api_calls=1,
+            tools_enabled=False
+        ),
+        id="no_tools_direct_response"
+    ),
+    pytest.param(
+        Scenario(
+            responses=[
+                _tool_response("search_course_content", {"query": "machine learning"}, "tool_1"),
+                _text_response("Here's information about machine learning")
             ],
-            stop_reason="tool_use"
-        )
-        
-        final_response = MockResponse(
-            content=[MockContentBlock(type="text", text="Here's information about machine learning")],
-            stop_reason="end_turn"
-        )
-        
-        # Configure mock to return different responses
-        ai_generator.client.messages.create.side_effect = [tool_use_response, final_response]
-        mock_tool_manager.execute_tool.return_value = "Found 5 results about machine learning"
-        
-        # Execute
-        result = ai_generator.generate_response(
-            query="Tell me about machine learning",
-            tools=sample_tools,
-            tool_manager=mock_tool_manager
-        )
-        
-        # Verify
-        assert result == "Here's information about machine learning"
-        assert ai_generator.client.messages.create.call_count == 2
-        mock_tool_manager.execute_tool.assert_called_once_with(
-            "search_course_content",
-            query="machine learning"
-        )
-    
-    def test_two_sequential_tool_calls(self, ai_generator, mock_tool_manager, sample_tools):
-        """Test two sequential tool calls before final response"""
-        # Setup
-        first_tool_response = MockResponse(
-            content=[
-                MockContentBlock(
-                    type="tool_use",
-                    name="get_course_outline",
-                    input={"course_title": "MCP"},
-                    id="tool_1"
-                )
+            tool_results="Found 5 results about machine learning",
+            expected_result="Here's information about machine learning",
+            expected_api_calls=2,
+            expected_tool_calls=[call("search_course_content", query="machine learning")]
+        ),
+        id="single_tool_call"
+    ),
+    pytest.param(
+        Scenario(
+            responses=[
+                _tool_response("get_course_outline", {"course_title": "MCP"}, "tool_1"),
+                _tool_response("search_course_content", {"query": "lesson 4 content"}, "tool_2"),
+                _text_response("Based on course outline and search results")
             ],
-            stop_reason="tool_use"
-        )
-        
-        second_tool_response = MockResponse(
-            content=[
-                MockContentBlock(
-                    type="tool_use",
-                    name="search_course_content",
-                    input={"query": "lesson 4 content"},
-                    id="tool_2"
-                )
+            tool_side_effect=[
+                "Course outline: Lesson 1, Lesson 2, Lesson 3, Lesson 4",
+                "Lesson 4 discusses advanced topics"
             ],
-            stop_reason="tool_use"
-        )
-        
-        final_response = MockResponse(
-            content=[MockContentBlock(type="text", text="Based on course outline and search results")],
-            stop_reason="end_turn"
-        )
-        
-        # Configure mock responses
-        ai_generator.client.messages.create.side_effect = [
-            first_tool_response,
-            second_tool_response,
-            final_response
-        ]
-        
-        mock_tool_manager.execute_tool.side_effect = [
-            "Course outline: Lesson 1, Lesson 2, Lesson 3, Lesson 4",
-            "Lesson 4 discusses advanced topics"
-        ]
-        
-        # Execute
-        result = ai_generator.generate_response(
-            query="What does lesson 4 of MCP course cover?",
-            tools=sample_tools,
-            tool_manager=mock_tool_manager,
-            max_tool_rounds=2
-        )
-        
-        # Verify
-        assert result == "Based on course outline and search results"
-        assert ai_generator.client.messages.create.call_count == 3
-        assert mock_tool_manager.execute_tool.call_count == 2
-        
-        # Verify tool calls in order
-        calls = mock_tool_manager.execute_tool.call_args_list
-        assert calls[0] == call("get_course_outline", course_title="MCP")
-        assert calls[1] == call("search_course_content", query="lesson 4 content")
-    
-    def test_max_rounds_termination(self, ai_generator, mock_tool_manager, sample_tools):
-        """Test termination when max rounds reached"""
-        # Setup - Claude keeps wanting to use tools
-        tool_responses = [
-            MockResponse(
-                content=[MockContentBlock(type="tool_use", name="search_course_content", input={"query": f"query_{i}"}, id=f"tool_{i}")],
-                stop_reason="tool_use"
-            ) for i in range(2)
-        ]
-        
-        # Final response when forced to stop (after max rounds, no more tools available)
-        final_response = MockResponse(
-            content=[MockContentBlock(type="text", text="Final answer after max rounds")],
-            stop_reason="end_turn"
-        )
-        
-        ai_generator.client.messages.create.side_effect = tool_responses + [final_response]
-        
-        # Execute with max_tool_rounds=2
-        result = ai_generator.generate_response(
-            query="Complex query",
-            tools=sample_tools,
-            tool_manager=mock_tool_manager,
-            max_tool_rounds=2
-        )
-        
-        # Verify
-        assert result == "Final answer after max rounds"
-        # Should make 2 tool calls + 1 final call without tools
-        assert ai_generator.client.messages.create.call_count == 3
-        assert mock_tool_manager.execute_tool.call_count == 2
+            max_tool_rounds=2,
+            expected_result="Based on course outline and search results",
+            expected_api_calls=3,
+            expected_tool_calls=[
+                call("get_course_outline", course_title="MCP"),
+                call("search_course_content", query="lesson 4 content")
+            ]
+        ),
+        id="two_sequential_tool_calls"
+    ),
+    pytest.param(
+        # Claude keeps wanting to use tools; 2 tool calls + 1 final call without tools
+        Scenario(
+            responses=[
+                _tool_response("search_course_content", {"query": f"query_{i}"}, f"tool_{i}")
+                for i in range(2)
+            ] + [_text_response("Final answer after max rounds")],
+            max_tool_rounds=2,
+            expected_result="Final answer after max rounds",
+            expected_api_calls=3,
+            expected_tool_calls=[call("search_course_content", query=f"query_{i}") for i in range(2)]
+        ),
+        id="max_rounds_termination"
+    ),
+    pytest.param(
+        # Tool errors should be passed back to Claude as tool results
+        Scenario(
+            responses=[
+                _tool_response("search_course_content", {"query": "test"}, "tool_1"),
+                _text_response("Handled error gracefully")
+            ],
+            tool_side_effect=Exception("Tool execution failed"),
+            expected_result="Handled error gracefully",
+            expected_api_calls=2,
+            expected_tool_calls=[call("search_course_content", query="test")]
+        ),
+        id="tool_execution_error_handling"
+    ),
+    pytest.param(
+        Scenario(
+            responses=[Exception("API error")],
+            expected_result="I encountered an error while processing your request.",
+            expected_api_calls=1
+        ),
+        id="api_call_error_handling"
+    ),
+    pytest.param(
+        Scenario(
+            responses=[
+                _tool_response("search_course_content", {"query": "xyz"}, "tool_1"),
+                _text_response("No results found")
+            ],
+            tool_results="",
+            expected_result="No results found",
+            expected_api_calls=2,
+            expected_tool_calls=[call("search_course_content", query="xyz")]
+        ),
+        id="empty_tool_results"
+    ),
+]
+
+
+class TestScenarios:
+    """Test scripted tool-calling and error scenarios"""
     
-    def test_tool_execution_error_handling(self, ai_generator, mock_tool_manager, sample_tools):
-        """Test graceful handling of tool execution errors"""
+    @pytest.mark.parametrize("scenario", SCENARIOS)
+    def test_scenario(self, ai_generator, mock_tool_manager, sample_tools, scenario):
+        """Run a scripted sequence of API responses and verify the outcome"""
         # Setup
-        tool_use_response = MockResponse(
-            content=[
-                MockContentBlock(
-                    type="tool_use",
-                    name="search_course_content",
-                    input={"query": "test"},
-                    id="tool_1"
-                )
-            ],
-            stop_reason="tool_use"
-        )
-        
-        final_response = MockResponse(
-            content=[MockContentBlock(type="text", text="Handled error gracefully")],
-            stop_reason="end_turn"
-        )
+        _set_responses(ai_generator, *scenario.responses)
+        if scenario.tool_results is not None:
+            mock_tool_manager.execute_tool.return_value = scenario.tool_results
+        if scenario.tool_side_effect is not None:
+            mock_tool_manager.execute_tool.side_effect = scenario.tool_side_effect
         
-        ai_generator.client.messages.create.side_effect = [tool_use_response, final_response]
-        
-        # Make tool execution raise an error
-        mock_tool_manager.execute_tool.side_effect = Exception("Tool execution failed")
-        
-        # Execute
-        result = ai_generator.generate_response(
-            query="Search for something",
-            tools=sample_tools,
-            tool_manager=mock_tool_manager
-        )
-        
-        # Verify - should continue and include error in tool results
-        assert result == "Handled error gracefully"
-        assert ai_generator.client.messages.create.call_count == 2
-    
-    def test_api_call_error_handling(self, ai_generator, mock_tool_manager, sample_tools):
-        """Test handling of API call errors"""
-        # Setup - API call raises exception
-        ai_generator.client.messages.create.side_effect = Exception("API error")
+        kwargs = {}
+        if scenario.max_tool_rounds is not None:
+            kwargs["max_tool_rounds"] = scenario.max_tool_rounds
         
         # Execute
         result = ai_generator.generate_response(
             query="Test query",
-            tools=sample_tools,
-            tool_manager=mock_tool_manager
+            tools=sample_tools if scenario.tools_enabled else None,
+            tool_manager=mock_tool_manager if scenario.tools_enabled else None,
+            **kwargs
         )
         
         # Verify
-        assert result == "I encountered an error while processing your request."
-        assert ai_generator.client.messages.create.call_count == 1
+        assert result == scenario.expected_result
+        assert ai_generator.client.messages.create.call_count == scenario.expected_api_calls
+        assert mock_tool_manager.execute_tool.call_args_list == scenario.expected_tool_calls
+
+
+class TestSequentialToolCalling:
+    """Test sequential tool calling functionality"""
     
     def test_conversation_history_preserved(self, ai_generator, mock_tool_manager, sample_tools):
         """Test that conversation history is preserved in system prompt"""
         # Setup
-        mock_response = MockResponse(
-            content=[MockContentBlock(type="text", text="Answer with context")],
-            stop_reason="end_turn"
-        )
-        ai_generator.client.messages.create.return_value = mock_response
+        ai_generator.client.messages.create.return_value = _text_response("Answer with context")
         
         conversation_history = "User: Previous question\nAssistant: Previous answer"
         
@@ -315,18 +262,12 @@ class TestSequentialToolCalling:
     def test_message_accumulation_across_rounds(self, ai_generator, mock_tool_manager, sample_tools):
         """Test that messages accumulate correctly across tool rounds"""
         # Setup
-        tool_response = MockResponse(
-            content=[MockContentBlock(type="tool_use", name="search_course_content", input={"query": "test"}, id="tool_1")],
-            stop_reason="tool_use"
-        )
-        
-        final_response = MockResponse(
-            content=[MockContentBlock(type="text", text="Final answer")],
-            stop_reason="end_turn"
+        _set_responses(
+            ai_generator,
+            _tool_response("search_course_content", {"query": "test"}, "tool_1"),
+            _text_response("Final answer")
         )
         
-        ai_generator.client.messages.create.side_effect = [tool_response, final_response]
-        
         # Execute
         result = ai_generator.generate_response(
             query="Test query",
@@ -350,18 +291,11 @@ class TestSequentialToolCalling:
         """Test that tools are not included in final API call after max rounds"""
         # Setup
         tool_responses = [
-            MockResponse(
-                content=[MockContentBlock(type="tool_use", name="search_course_content", input={"query": f"q{i}"}, id=f"t{i}")],
-                stop_reason="tool_use"
-            ) for i in range(2)
+            _tool_response("search_course_content", {"query": f"q{i}"}, f"t{i}")
+            for i in range(2)
         ]
         
-        final_response = MockResponse(
-            content=[MockContentBlock(type="text", text="Final")],
-            stop_reason="end_turn"
-        )
-        
-        ai_generator.client.messages.create.side_effect = tool_responses + [final_response]
+        _set_responses(ai_generator, *tool_responses, _text_response("Final"))
         
         # Execute
         result = ai_generator.generate_response(
@@ -383,12 +317,7 @@ class TestErrorScenarios:
     def test_critical_tool_execution_error(self, ai_generator, mock_tool_manager, sample_tools):
         """Test handling of critical errors during tool execution"""
         # Setup
-        tool_response = MockResponse(
-            content=[MockContentBlock(type="tool_use", name="bad_tool", input={}, id="tool_1")],
-            stop_reason="tool_use"
-        )
-        
-        ai_generator.client.messages.create.return_value = tool_response
+        ai_generator.client.messages.create.return_value = _tool_response("bad_tool", {}, "tool_1")
         
         # Make _execute_tools_and_update_messages raise an exception
         with patch.object(ai_generator, '_execute_tools_and_update_messages', return_value=None):
@@ -399,32 +328,6 @@ class TestErrorScenarios:
             )
             
             assert result == "I encountered an error while processing tool results."
-    
-    def test_empty_tool_results(self, ai_generator, mock_tool_manager, sample_tools):
-        """Test handling when tool returns empty results"""
-        # Setup
-        tool_response = MockResponse(
-            content=[MockContentBlock(type="tool_use", name="search_course_content", input={"query": "xyz"}, id="tool_1")],
-            stop_reason="tool_use"
-        )
-        
-        final_response = MockResponse(
-            content=[MockContentBlock(type="text", text="No results found")],
-            stop_reason="end_turn"
-        )
-        
-        ai_generator.client.messages.create.side_effect = [tool_response, final_response]
-        mock_tool_manager.execute_tool.return_value = ""
-        
-        # Execute
-        result = ai_generator.generate_response(
-            query="Search for xyz",
-            tools=sample_tools,
-            tool_manager=mock_tool_manager
-        )
-        
-        # Verify it handles empty results gracefully
-        assert result == "No results found"
 
 
 if __name__ == "__main__":
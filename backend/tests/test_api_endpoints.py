@@ -1,23 +1,49 @@
+import asyncio
+from types import MappingProxyType
+
 import pytest
-from unittest.mock import MagicMock, patch
-import json
+import orjson
+
+
+# Request payloads built once at import
+_LONG_QUERY = "What is " + "machine learning and " * 100 + "how does it work?"
+_UNICODE_QUERY = "Explain 机器学习 (machine learning) 🤖"
+_SPECIAL_QUERY = "What about ML & AI? <script>alert('test')</script>"
+
+# Request headers shared across tests
+_JSON_HEADERS = {"Content-Type": "application/json"}
+_FORM_HEADERS = {"Content-Type": "application/x-www-form-urlencoded"}
+
+# Pre-serialized JSON bodies for repeated requests, sent with content= instead of json=
+_TEST_QUERY_BODY = orjson.dumps({"query": "Test query"})
+_SESSIONS = ["session_1", "session_2", "session_3"]
+_SESSION_QUERY_BODIES = {
+    session_id: orjson.dumps({"query": f"Query for {session_id}", "session_id": session_id})
+    for session_id in _SESSIONS
+}
+
+# Analytics for an empty course catalog
+_EMPTY_ANALYTICS = MappingProxyType({"total_courses": 0, "course_titles": ()})
+
+
+def _json(response):
+    """Decode a response body with orjson, once per response"""
+    try:
+        return response._decoded_json
+    except AttributeError:
+        response._decoded_json = orjson.loads(response.content)
+        return response._decoded_json
 
 
 class TestQueryEndpoint:
     """Test the /api/query endpoint"""
     
-    def test_query_with_session_id(self, test_client):
+    def test_query_with_session_id(self, baseline_query_response):
         """Test query with existing session ID"""
-        response = test_client.post(
-            "/api/query",
-            json={
-                "query": "What is machine learning?",
-                "session_id": "existing_session_123"
-            }
-        )
+        response = baseline_query_response
         
         assert response.status_code == 200
-        data = response.json()
+        data = _json(response)
         assert "answer" in data
         assert "sources" in data
         assert "session_id" in data
@@ -25,117 +51,103 @@ class TestQueryEndpoint:
         assert isinstance(data["sources"], list)
         assert len(data["sources"]) == 2
     
-    def test_query_without_session_id(self, test_client):
-        """Test query without session ID (should create new session)"""
-        response = test_client.post(
+    async def test_query_forwards_to_rag_system(self, test_client, rag_spy):
+        """Test query and session ID are passed through to the RAG system"""
+        response = await test_client.post(
             "/api/query",
-            json={"query": "Explain neural networks"}
+            json={
+                "query": "What is machine learning?",
+                "session_id": "existing_session_123"
+            }
         )
         
         assert response.status_code == 200
-        data = response.json()
-        assert "answer" in data
-        assert "sources" in data
-        assert "session_id" in data
-        assert data["session_id"] == "test_session_123"  # Mock creates this
+        rag_spy.query.assert_called_once_with("What is machine learning?", "existing_session_123")
+        rag_spy.session_manager.create_session.assert_not_called()
     
-    def test_query_empty_string(self, test_client):
-        """Test query with empty string"""
-        response = test_client.post(
-            "/api/query",
-            json={"query": ""}
-        )
-        
-        # Should still work but might return different response
-        assert response.status_code in [200, 422]  # 422 if validation fails
-    
-    def test_query_long_text(self, test_client):
-        """Test query with very long text"""
-        long_query = "What is " + "machine learning and " * 100 + "how does it work?"
-        response = test_client.post(
+    async def test_query_without_session_id(self, test_client):
+        """Test query without session ID (should create new session)"""
+        response = await test_client.post(
             "/api/query",
-            json={"query": long_query}
+            json={"query": "Explain neural networks"}
         )
         
         assert response.status_code == 200
-        data = response.json()
+        data = _json(response)
         assert "answer" in data
+        assert "sources" in data
+        assert "session_id" in data
+        assert data["session_id"] == "test_session_123"  # Mock creates this
     
-    def test_query_special_characters(self, test_client):
-        """Test query with special characters"""
-        response = test_client.post(
+    @pytest.mark.parametrize("query, expected_statuses", [
+        pytest.param("", {200, 422}, id="empty_string"),  # 422 if validation fails
+        pytest.param(_LONG_QUERY, {200}, id="long_text"),
+        pytest.param(_SPECIAL_QUERY, {200}, id="special_characters"),
+        pytest.param(_UNICODE_QUERY, {200}, id="unicode_characters"),
+    ])
+    async def test_query_payload_variants(self, test_client, query, expected_statuses):
+        """Test query with unusual query text"""
+        response = await test_client.post(
             "/api/query",
-            json={"query": "What about ML & AI? <script>alert('test')</script>"}
+            json={"query": query}
         )
         
-        assert response.status_code == 200
-        data = response.json()
-        assert "answer" in data
-        # Ensure no script tags in response
-        assert "<script>" not in data["answer"]
+        assert response.status_code in expected_statuses
+        if response.status_code == 200:
+            assert "answer" in _json(response)
     
-    def test_query_unicode_characters(self, test_client):
-        """Test query with Unicode characters"""
-        response = test_client.post(
+    async def test_query_special_characters_not_echoed(self, test_client):
+        """Test script tags in the query do not reach the answer"""
+        response = await test_client.post(
             "/api/query",
-            json={"query": "Explain 机器学习 (machine learning) 🤖"}
+            json={"query": _SPECIAL_QUERY}
         )
         
         assert response.status_code == 200
-        data = response.json()
-        assert "answer" in data
+        assert "<script>" not in _json(response)["answer"]
     
-    def test_query_missing_query_field(self, test_client):
+    async def test_query_missing_query_field(self, test_client):
         """Test request missing query field"""
-        response = test_client.post(
+        response = await test_client.post(
             "/api/query",
             json={"session_id": "test_123"}
         )
         
         assert response.status_code == 422  # Validation error
-        assert "detail" in response.json()
+        assert "detail" in _json(response)
     
-    def test_query_invalid_json(self, test_client):
+    async def test_query_invalid_json(self, test_client):
         """Test request with invalid JSON"""
-        response = test_client.post(
+        response = await test_client.post(
             "/api/query",
-            data="invalid json{",
-            headers={"Content-Type": "application/json"}
+            content=b"invalid json{",
+            headers=_JSON_HEADERS
         )
         
         assert response.status_code == 422
     
-    def test_query_error_handling(self, test_client):
+    async def test_query_error_handling(self, test_client):
         """Test error handling when RAG system raises exception"""
         # Make the mock raise an exception
         test_client.mock_rag.query.side_effect = Exception("Database error")
         
-        response = test_client.post(
+        response = await test_client.post(
             "/api/query",
-            json={"query": "Test query"}
+            content=_TEST_QUERY_BODY,
+            headers=_JSON_HEADERS
         )
         
         assert response.status_code == 500
-        data = response.json()
+        data = _json(response)
         assert "detail" in data
         assert "Database error" in data["detail"]
-        
-        # Reset the mock
-        test_client.mock_rag.query.side_effect = None
-        test_client.mock_rag.query.return_value = ("Test response", ["Source 1"])
     
-    def test_query_response_structure(self, test_client):
+    def test_query_response_structure(self, baseline_query_response):
         """Test the structure of successful query response"""
-        response = test_client.post(
-            "/api/query",
-            json={
-                "query": "Test query",
-                "session_id": "test_session"
-            }
-        )
+        response = baseline_query_response
         
         assert response.status_code == 200
-        data = response.json()
+        data = _json(response)
         
         # Check response structure
         assert isinstance(data, dict)
@@ -151,23 +163,25 @@ class TestQueryEndpoint:
 class TestCoursesEndpoint:
     """Test the /api/courses endpoint"""
     
-    def test_get_courses_success(self, test_client):
+    @pytest.mark.readonly
+    async def test_get_courses_success(self, test_client):
         """Test successful retrieval of course statistics"""
-        response = test_client.get("/api/courses")
+        response = await test_client.get("/api/courses")
         
         assert response.status_code == 200
-        data = response.json()
+        data = _json(response)
         assert "total_courses" in data
         assert "course_titles" in data
         assert data["total_courses"] == 3
         assert len(data["course_titles"]) == 3
     
-    def test_courses_response_structure(self, test_client):
+    @pytest.mark.readonly
+    async def test_courses_response_structure(self, test_client):
         """Test the structure of courses response"""
-        response = test_client.get("/api/courses")
+        response = await test_client.get("/api/courses")
         
         assert response.status_code == 200
-        data = response.json()
+        data = _json(response)
         
         # Check response structure
         assert isinstance(data, dict)
@@ -179,56 +193,41 @@ class TestCoursesEndpoint:
             assert isinstance(title, str)
             assert len(title) > 0
     
-    def test_courses_error_handling(self, test_client):
+    async def test_courses_error_handling(self, test_client):
         """Test error handling when get_course_analytics raises exception"""
         # Make the mock raise an exception
         test_client.mock_rag.get_course_analytics.side_effect = Exception("Analytics error")
         
-        response = test_client.get("/api/courses")
+        response = await test_client.get("/api/courses")
         
         assert response.status_code == 500
-        data = response.json()
+        data = _json(response)
         assert "detail" in data
         assert "Analytics error" in data["detail"]
-        
-        # Reset the mock
-        test_client.mock_rag.get_course_analytics.side_effect = None
-        test_client.mock_rag.get_course_analytics.return_value = {
-            "total_courses": 3,
-            "course_titles": ["Course 1", "Course 2", "Course 3"]
-        }
     
-    def test_courses_empty_database(self, test_client):
+    async def test_courses_empty_database(self, test_client):
         """Test courses endpoint when no courses are loaded"""
         # Configure mock to return empty results
-        test_client.mock_rag.get_course_analytics.return_value = {
-            "total_courses": 0,
-            "course_titles": []
-        }
+        test_client.mock_rag.get_course_analytics.return_value = _EMPTY_ANALYTICS
         
-        response = test_client.get("/api/courses")
+        response = await test_client.get("/api/courses")
         
         assert response.status_code == 200
-        data = response.json()
+        data = _json(response)
         assert data["total_courses"] == 0
         assert data["course_titles"] == []
-        
-        # Reset the mock
-        test_client.mock_rag.get_course_analytics.return_value = {
-            "total_courses": 3,
-            "course_titles": ["Course 1", "Course 2", "Course 3"]
-        }
 
 
 class TestRootEndpoint:
     """Test the root / endpoint"""
     
-    def test_root_endpoint(self, test_client):
+    @pytest.mark.readonly
+    async def test_root_endpoint(self, test_client):
         """Test root endpoint returns API information"""
-        response = test_client.get("/")
+        response = await test_client.get("/")
         
         assert response.status_code == 200
-        data = response.json()
+        data = _json(response)
         assert "message" in data
         assert "RAG System" in data["message"]
 
@@ -236,40 +235,37 @@ class TestRootEndpoint:
 class TestConcurrentRequests:
     """Test concurrent request handling"""
     
-    def test_multiple_queries_different_sessions(self, test_client):
+    async def test_multiple_queries_different_sessions(self, test_client):
         """Test multiple queries with different session IDs"""
-        sessions = ["session_1", "session_2", "session_3"]
-        responses = []
-        
-        for session_id in sessions:
-            response = test_client.post(
+        responses = await asyncio.gather(*(
+            test_client.post(
                 "/api/query",
-                json={
-                    "query": f"Query for {session_id}",
-                    "session_id": session_id
-                }
+                content=_SESSION_QUERY_BODIES[session_id],
+                headers=_JSON_HEADERS
             )
-            responses.append(response)
+            for session_id in _SESSIONS
+        ))
         
         # All should succeed
         for i, response in enumerate(responses):
             assert response.status_code == 200
-            data = response.json()
-            assert data["session_id"] == sessions[i]
+            data = _json(response)
+            assert data["session_id"] == _SESSIONS[i]
     
-    def test_mixed_endpoint_requests(self, test_client):
+    async def test_mixed_endpoint_requests(self, test_client):
         """Test mixed requests to different endpoints"""
         # Query endpoint
-        query_response = test_client.post(
+        query_response = await test_client.post(
             "/api/query",
-            json={"query": "Test query"}
+            content=_TEST_QUERY_BODY,
+            headers=_JSON_HEADERS
         )
         
         # Courses endpoint
-        courses_response = test_client.get("/api/courses")
+        courses_response = await test_client.get("/api/courses")
         
         # Root endpoint
-        root_response = test_client.get("/")
+        root_response = await test_client.get("/")
         
         # All should succeed
         assert query_response.status_code == 200
@@ -280,9 +276,9 @@ class TestConcurrentRequests:
 class TestEdgeCases:
     """Test edge cases and boundary conditions"""
     
-    def test_query_with_null_session_id(self, test_client):
+    async def test_query_with_null_session_id(self, test_client):
         """Test query with null session_id"""
-        response = test_client.post(
+        response = await test_client.post(
             "/api/query",
             json={
                 "query": "Test query",
@@ -291,13 +287,13 @@ class TestEdgeCases:
         )
         
         assert response.status_code == 200
-        data = response.json()
+        data = _json(response)
         # Should create new session
         assert data["session_id"] == "test_session_123"
     
-    def test_query_with_numeric_session_id(self, test_client):
+    async def test_query_with_numeric_session_id(self, test_client):
         """Test query with numeric session_id (should be converted to string)"""
-        response = test_client.post(
+        response = await test_client.post(
             "/api/query",
             json={
                 "query": "Test query",
@@ -307,12 +303,12 @@ class TestEdgeCases:
         
         # Should either work or fail validation
         if response.status_code == 200:
-            data = response.json()
+            data = _json(response)
             assert isinstance(data["session_id"], (str, int))
     
-    def test_query_with_extra_fields(self, test_client):
+    async def test_query_with_extra_fields(self, test_client):
         """Test query with extra fields (should be ignored)"""
-        response = test_client.post(
+        response = await test_client.post(
             "/api/query",
             json={
                 "query": "Test query",
@@ -323,16 +319,17 @@ class TestEdgeCases:
         )
         
         assert response.status_code == 200
-        data = response.json()
+        data = _json(response)
         assert "extra_field" not in data
         assert "another_field" not in data
     
-    def test_courses_with_query_params(self, test_client):
+    @pytest.mark.readonly
+    async def test_courses_with_query_params(self, test_client):
         """Test courses endpoint ignores query parameters"""
-        response = test_client.get("/api/courses?filter=ml&sort=asc")
+        response = await test_client.get("/api/courses?filter=ml&sort=asc")
         
         assert response.status_code == 200
-        data = response.json()
+        data = _json(response)
         # Should return all courses regardless of params
         assert data["total_courses"] == 3
 
@@ -340,65 +337,78 @@ class TestEdgeCases:
 class TestHTTPMethods:
     """Test HTTP method restrictions"""
     
-    def test_query_get_not_allowed(self, test_client):
-        """Test GET method not allowed for query endpoint"""
-        response = test_client.get("/api/query")
+    @pytest.mark.parametrize("method, path", [
+        ("GET", "/api/query"),
+        ("PUT", "/api/query"),
+        ("DELETE", "/api/query"),
+        ("POST", "/api/courses"),
+    ])
+    async def test_method_not_allowed(self, test_client, method, path):
+        """Test unsupported HTTP methods are rejected"""
+        response = await test_client.request(method, path)
         assert response.status_code == 405  # Method not allowed
-    
-    def test_courses_post_not_allowed(self, test_client):
-        """Test POST method not allowed for courses endpoint"""
-        response = test_client.post("/api/courses", json={})
-        assert response.status_code == 405
-    
-    def test_query_put_not_allowed(self, test_client):
-        """Test PUT method not allowed for query endpoint"""
-        response = test_client.put(
-            "/api/query",
-            json={"query": "Test"}
-        )
-        assert response.status_code == 405
-    
-    def test_query_delete_not_allowed(self, test_client):
-        """Test DELETE method not allowed for query endpoint"""
-        response = test_client.delete("/api/query")
-        assert response.status_code == 405
 
 
 class TestContentTypes:
     """Test content type handling"""
     
-    def test_query_json_content_type(self, test_client):
+    @pytest.mark.readonly
+    async def test_query_json_content_type(self, test_client):
         """Test query with correct JSON content type"""
-        response = test_client.post(
+        response = await test_client.post(
             "/api/query",
-            json={"query": "Test query"},
-            headers={"Content-Type": "application/json"}
+            content=_TEST_QUERY_BODY,
+            headers=_JSON_HEADERS
         )
         
         assert response.status_code == 200
         assert response.headers["content-type"] == "application/json"
     
-    def test_query_form_data_not_accepted(self, test_client):
+    @pytest.mark.readonly
+    async def test_query_form_data_not_accepted(self, test_client):
         """Test query with form data is not accepted"""
-        response = test_client.post(
+        response = await test_client.post(
             "/api/query",
-            data={"query": "Test query"},
-            headers={"Content-Type": "application/x-www-form-urlencoded"}
+            content=b"query=Test+query",
+            headers=_FORM_HEADERS
         )
         
         assert response.status_code == 422
     
-    def test_courses_returns_json(self, test_client):
+    @pytest.mark.readonly
+    async def test_courses_returns_json(self, test_client):
         """Test courses endpoint returns JSON"""
-        response = test_client.get("/api/courses")
+        response = await test_client.get("/api/courses")
         
         assert response.status_code == 200
         assert response.headers["content-type"] == "application/json"
         
         # Verify it's valid JSON
-        data = response.json()
+        data = _json(response)
         assert isinstance(data, dict)
 
 
+class TestDependencies:
+    """Test the get_rag dependency used by app.py"""
+    
+    async def test_get_rag_returns_shared_rag_system(self, monkeypatch):
+        """Test get_rag resolves the RAG system app.py installs"""
+        import dependencies
+        
+        rag = object()
+        monkeypatch.setattr(dependencies, "rag_system", rag)
+        
+        assert await dependencies.get_rag() is rag
+    
+    async def test_get_rag_before_initialisation(self, monkeypatch):
+        """Test get_rag fails clearly when app.py has not installed a RAG system"""
+        import dependencies
+        
+        monkeypatch.setattr(dependencies, "rag_system", None)
+        
+        with pytest.raises(RuntimeError, match="RAG system not initialised"):
+            await dependencies.get_rag()
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file